@@ -2,8 +2,9 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from config import Config
+from app.utils.campus import CampusSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': CampusSession})
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
 login_manager.login_message = 'Please log in to access BroLift.'
@@ -29,6 +30,18 @@ def create_app(config_class=Config):
     app.register_blueprint(dashboard_bp)
 
     with app.app_context():
+        from app.utils.campus import all_campuses, campus_tables, seed_campuses
+        from app.utils.upgrade import upgrade_schema
         db.create_all()
+        for key in app.config['SQLALCHEMY_BINDS']:
+            db.metadata.create_all(db.engines[key], tables=campus_tables(db.metadata))
+        seed_campuses(app.config['CAMPUSES'])
+
+        # Older databases: add new columns/indexes and assign existing rows to
+        # the campus that owns each database (the default DB -> first campus)
+        owners = {c.bind_key: c.id for c in reversed(all_campuses())}
+        upgrade_schema(db.engine, db.metadata.sorted_tables, owners.get(None))
+        for key in app.config['SQLALCHEMY_BINDS']:
+            upgrade_schema(db.engines[key], campus_tables(db.metadata), owners.get(key))
 
     return app
@@ -1,15 +1,45 @@
 from datetime import datetime
+from itertools import chain
+from sqlalchemy import event, or_, select, update
+from sqlalchemy.orm import Session
 from app import db, login_manager
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Session ids are "<campus_id>:<user_id>" so we know which database to look in
+    from app.utils.campus import get_campus, use_campus
+    campus_id, _, uid = user_id.rpartition(':')
+    use_campus(get_campus(int(campus_id) if campus_id else None))
+    return User.query.get(int(uid))
+
+
+class Campus(db.Model):
+    """A college served by this deployment. Cached in app.utils.campus."""
+    __tablename__ = 'campuses'
+    id            = db.Column(db.Integer, primary_key=True)
+    slug          = db.Column(db.String(40), unique=True, nullable=False)
+    name          = db.Column(db.String(150), nullable=False)
+    short_name    = db.Column(db.String(40), nullable=False)
+    email_pattern = db.Column(db.String(200), nullable=False)   # regex a student email must match
+    email_example = db.Column(db.String(120))
+    lat           = db.Column(db.Float, nullable=False)
+    lng           = db.Column(db.Float, nullable=False)
+    fuel_city     = db.Column(db.String(40), default='chennai') # goodreturns.in city slug
+    bind_key      = db.Column(db.String(40))                    # SQLALCHEMY_BINDS key, None = default DB
+
+    @property
+    def location(self):
+        return {'lat': self.lat, 'lng': self.lng}
+
+    def __repr__(self): return f'<Campus {self.slug}>'
+
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
     id             = db.Column(db.Integer, primary_key=True)
+    campus_id      = db.Column(db.Integer)  # no FK: may live in a separate campus DB
     name           = db.Column(db.String(100), nullable=False)
     email          = db.Column(db.String(120), unique=True, nullable=False)
     password_hash  = db.Column(db.String(256), nullable=False)
@@ -31,6 +61,14 @@ class User(UserMixin, db.Model):
     def is_female(self):
         return self.gender == 'female'
 
+    @property
+    def campus(self):
+        from app.utils.campus import get_campus
+        return get_campus(self.campus_id)
+
+    def get_id(self):
+        return f'{self.campus_id or ""}:{self.id}'
+
     # backward-compat
     @property
     def has_car(self):        return self.has_vehicle
@@ -47,11 +85,13 @@ class User(UserMixin, db.Model):
 class Ride(db.Model):
     __tablename__ = 'rides'
     id              = db.Column(db.Integer, primary_key=True)
+    campus_id       = db.Column(db.Integer)
     host_id         = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    template_id     = db.Column(db.Integer, db.ForeignKey('ride_templates.id'))  # set for generated commutes
     start_location  = db.Column(db.String(300), nullable=False)
     start_lat       = db.Column(db.Float)
     start_lng       = db.Column(db.Float)
-    destination     = db.Column(db.String(300), default='SRM IST Campus')
+    destination     = db.Column(db.String(300))
     dest_lat        = db.Column(db.Float)
     dest_lng        = db.Column(db.Float)
     departure_time  = db.Column(db.DateTime, nullable=False)
@@ -63,11 +103,25 @@ class Ride(db.Model):
     status          = db.Column(db.String(20), default='confirmed')
     passenger_preference = db.Column(db.String(20), default='any') # any / female_only
     notes           = db.Column(db.Text)
+    version         = db.Column(db.Integer, nullable=False, default=1)  # bumped on any change, see below
     created_at      = db.Column(db.DateTime, default=datetime.utcnow)
 
     requests = db.relationship('RideRequest', backref='ride', lazy=True, cascade='all, delete-orphan')
     messages = db.relationship('Message', backref='ride', lazy=True, cascade='all, delete-orphan')
 
+    # Hot paths: find_ride scans by (campus, departure), the dashboard by (campus, host)
+    # One ride per commute template per departure keeps the generator idempotent
+    __table_args__ = (
+        db.Index('ix_rides_campus_departure', 'campus_id', 'departure_time'),
+        db.Index('ix_rides_campus_host', 'campus_id', 'host_id', 'departure_time'),
+        db.Index('uq_rides_template_departure', 'template_id', 'departure_time', unique=True),
+    )
+
+    @property
+    def campus(self):
+        from app.utils.campus import get_campus
+        return get_campus(self.campus_id)
+
     @property
     def confirmed_passengers(self):
         return [r for r in self.requests if r.status == 'confirmed']
@@ -90,9 +144,57 @@ class Ride(db.Model):
             return round(self.total_fuel_cost / (self.available_seats + 1), 2)
         return 0.0
 
+    @property
+    def fuel_price(self):
+        """Fuel price in effect when the ride was posted, from the price history."""
+        from app.utils.fuel_prices import price_at
+        return price_at(self.fuel_type, self.created_at or datetime.utcnow(), self.campus.fuel_city)
+
     def __repr__(self): return f'<Ride {self.id}>'
 
 
+class RideTemplate(db.Model):
+    """
+    A recurring commute. app.utils.commutes materializes it into Ride rows
+    for the days in weekday_mask, copying the cached route distance and cost.
+    """
+    __tablename__ = 'ride_templates'
+    id              = db.Column(db.Integer, primary_key=True)
+    campus_id       = db.Column(db.Integer)
+    host_id         = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    start_location  = db.Column(db.String(300), nullable=False)
+    start_lat       = db.Column(db.Float)
+    start_lng       = db.Column(db.Float)
+    destination     = db.Column(db.String(300))
+    dest_lat        = db.Column(db.Float)
+    dest_lng        = db.Column(db.Float)
+    weekday_mask    = db.Column(db.Integer, nullable=False)     # bit 0 = Monday ... bit 6 = Sunday
+    departure       = db.Column(db.Time, nullable=False)
+    available_seats = db.Column(db.Integer, nullable=False, default=4)
+    passenger_preference = db.Column(db.String(20), default='any')
+    vehicle_type    = db.Column(db.String(10), default='car')
+    fuel_type       = db.Column(db.String(10), default='petrol')
+    distance_km     = db.Column(db.Float, default=0.0)          # cached from the Directions lookup
+    total_fuel_cost = db.Column(db.Float, default=0.0)
+    notes           = db.Column(db.Text)
+    active          = db.Column(db.Boolean, default=True)
+    created_at      = db.Column(db.DateTime, default=datetime.utcnow)
+
+    host  = db.relationship('User', foreign_keys=[host_id])
+    rides = db.relationship('Ride', backref='template', lazy=True)
+
+    WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+    def runs_on(self, day):
+        return bool(self.weekday_mask & (1 << day.weekday()))
+
+    @property
+    def weekday_names(self):
+        return [d for i, d in enumerate(self.WEEKDAYS) if self.weekday_mask & (1 << i)]
+
+    def __repr__(self): return f'<RideTemplate {self.id}>'
+
+
 class RideRequest(db.Model):
     __tablename__ = 'ride_requests'
     id              = db.Column(db.Integer, primary_key=True)
@@ -119,3 +221,93 @@ class Message(db.Model):
     sender = db.relationship('User', foreign_keys=[sender_id])
 
     def __repr__(self): return f'<Message {self.id}>'
+
+
+
+class FuelPrice(db.Model):
+    """
+    Fuel price history: one row per city and fuel per fetch that changed the price.
+    Unchanged prices are not re-inserted, so a row holds until the next one.
+    """
+    __tablename__ = 'fuel_price_history'
+    id         = db.Column(db.Integer, primary_key=True)
+    city       = db.Column(db.String(40), nullable=False, default='chennai')
+    fuel       = db.Column(db.String(10), nullable=False)   # petrol/diesel/cng
+    price      = db.Column(db.Float, nullable=False)        # Rs per litre/kg
+    source     = db.Column(db.String(60))
+    fetched_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (db.Index('ix_fuel_price_history_city_fuel_fetched', 'city', 'fuel', 'fetched_at'),)
+
+    def __repr__(self): return f'<FuelPrice {self.fuel} {self.price}>'
+
+
+class SearchEvent(db.Model):
+    """One find_ride search. Append-only; written in batches by app.utils.demand."""
+    __tablename__ = 'search_events'
+    id              = db.Column(db.Integer, primary_key=True)
+    campus_id       = db.Column(db.Integer)
+    user_id         = db.Column(db.Integer, db.ForeignKey('users.id'))
+    pickup_location = db.Column(db.String(300))
+    pickup_lat      = db.Column(db.Float)
+    pickup_lng      = db.Column(db.Float)
+    wanted_at       = db.Column(db.DateTime, nullable=False)  # when the rider wants to travel
+    results         = db.Column(db.Integer, default=0)         # 0 == unmet demand
+    created_at      = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Demand rebuild scans one campus's recent window
+    __table_args__ = (db.Index('ix_search_events_campus_wanted', 'campus_id', 'wanted_at'),)
+
+    def __repr__(self): return f'<SearchEvent {self.id}>'
+
+
+class DemandCell(db.Model):
+    """
+    Precomputed supply/demand cube: one row per campus x grid cell x hour-of-week.
+    Rebuilt wholesale by app.utils.demand.rebuild_demand_cells().
+    hour_of_week = day (0 = Sunday) * 24 + hour.
+    """
+    __tablename__ = 'demand_cells'
+    campus_id    = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    hour_of_week = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    lat_idx      = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    lng_idx      = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    searches     = db.Column(db.Integer, default=0)
+    unmet        = db.Column(db.Integer, default=0)
+    requests     = db.Column(db.Integer, default=0)
+    rides        = db.Column(db.Integer, default=0)
+
+    def __repr__(self): return f'<DemandCell {self.hour_of_week}:{self.lat_idx},{self.lng_idx}>'
+
+
+@event.listens_for(Session, 'before_flush')
+def _bump_ride_versions(session, flush_context, instances):
+    """
+    Ride.version is the ETag validator for the ride page and dashboard, so it
+    must change whenever the ride, one of its requests or messages, or a user
+    shown on it (host, rider, chat sender) does.
+    """
+    ride_ids, user_ids = set(), set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Ride):
+            if obj in session.dirty and session.is_modified(obj, include_collections=False):
+                obj.version = (obj.version or 0) + 1
+        elif isinstance(obj, (RideRequest, Message)) and obj.ride_id is not None:
+            ride_ids.add(obj.ride_id)
+        elif isinstance(obj, User) and obj in session.dirty \
+                and session.is_modified(obj, include_collections=False):
+            user_ids.add(obj.id)
+
+    rides = Ride.__table__
+    targets = []
+    if ride_ids:
+        targets.append(rides.c.id.in_(ride_ids))
+    if user_ids:
+        targets += [
+            rides.c.host_id.in_(user_ids),
+            rides.c.id.in_(select(RideRequest.ride_id).where(RideRequest.rider_id.in_(user_ids))),
+            rides.c.id.in_(select(Message.ride_id).where(Message.sender_id.in_(user_ids))),
+        ]
+    if targets:
+        session.execute(update(rides).where(or_(*targets))
+                        .values(version=rides.c.version + 1))
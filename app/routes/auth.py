@@ -1,15 +1,13 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_user, logout_user, login_required, current_user
-import re
 from app import db
 from app.models import User
+from app.utils.campus import all_campuses, campus_for_email, use_campus
 
 auth_bp = Blueprint('auth', __name__)
 
-def is_valid_srm_email(email):
-    """Validate SRM IST email: 2 letters + 4 digits @srmist.edu.in"""
-    pattern = r'^[a-zA-Z]{2}\d{4}@srmist\.edu\.in$'
-    return bool(re.match(pattern, email.lower()))
+def _email_examples():
+    return ', '.join(c.email_example for c in all_campuses() if c.email_example)
 
 @auth_bp.route('/register', methods=['GET', 'POST'])
 def register():
@@ -29,12 +27,15 @@ def register():
         fuel_type = request.form.get('fuel_type', 'petrol')
         gender = request.form.get('gender', 'other')
 
+        campus = campus_for_email(email) if email else None
+        use_campus(campus)
+
         errors = []
         if not name:
             errors.append('Name is required.')
-        if not email or not is_valid_srm_email(email):
-            errors.append('Only valid SRM IST emails allowed (e.g. st6546@srmist.edu.in).')
-        if User.query.filter_by(email=email).first():
+        if not campus:
+            errors.append(f'Only valid college emails allowed (e.g. {_email_examples()}).')
+        elif User.query.filter_by(email=email).first():
             errors.append('Email already registered.')
         if len(password) < 6:
             errors.append('Password must be at least 6 characters.')
@@ -44,9 +45,11 @@ def register():
             errors.append('Please provide your vehicle model and number.')
 
         if errors:
-            return render_template('auth/register.html', errors=errors, form_data=request.form)
+            return render_template('auth/register.html', errors=errors, form_data=request.form,
+                                   email_examples=_email_examples())
 
         user = User(
+            campus_id=campus.id,
             name=name, email=email,
             has_vehicle=has_vehicle,
             vehicle_type=vehicle_type,
@@ -64,7 +67,8 @@ def register():
         login_user(user)
         return redirect(url_for('dashboard.index'))
 
-    return render_template('auth/register.html', errors=[], form_data={})
+    return render_template('auth/register.html', errors=[], form_data={},
+                           email_examples=_email_examples())
 
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -73,7 +77,9 @@ def login():
     if request.method == 'POST':
         email = request.form.get('email', '').strip().lower()
         password = request.form.get('password', '')
-        user = User.query.filter_by(email=email).first()
+        campus = campus_for_email(email)
+        use_campus(campus)
+        user = User.query.filter_by(email=email).first() if campus else None
         if user and user.check_password(password):
             login_user(user)
             next_page = request.args.get('next')
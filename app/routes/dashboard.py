@@ -1,7 +1,10 @@
 from flask import Blueprint, render_template, redirect, url_for
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta
-from app.models import Ride, RideRequest
+from sqlalchemy import case, func, or_
+from app import db
+from app.models import Ride, RideRequest, RideTemplate
+from app.utils.conditional import not_modified, with_validators, viewer_tag
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
@@ -15,9 +18,33 @@ def landing():
 @dashboard_bp.route('/dashboard')
 @login_required
 def index():
-    hosted_rides = Ride.query.filter_by(host_id=current_user.id)\
+    from app.utils.commutes import ensure_generated
+    ensure_generated()
+
+    # One aggregate over the user's rides: any change to them, their requests or
+    # chats bumps a version; a ride departing changes the upcoming count.
+    now = datetime.now()
+    requested = db.session.query(RideRequest.ride_id).filter(RideRequest.rider_id == current_user.id)
+    n_rides, version_sum, n_upcoming = db.session.query(
+        func.count(Ride.id), func.sum(Ride.version),
+        func.sum(case((Ride.departure_time >= now, 1), else_=0))
+    ).filter(Ride.campus_id == current_user.campus_id,
+             or_(Ride.host_id == current_user.id, Ride.id.in_(requested))).one()
+    # Starting or stopping a commute changes the count or the newest id
+    n_commutes, last_commute = db.session.query(func.count(RideTemplate.id), func.max(RideTemplate.id))\
+        .filter_by(campus_id=current_user.campus_id, host_id=current_user.id, active=True).one()
+    etag = (f'dash-{n_rides}-{version_sum or 0}-{n_upcoming or 0}-c{n_commutes}-{last_commute or 0}'
+            f'-{now:%Y%m%d}-{viewer_tag()}')
+    cached = not_modified(etag=etag)
+    if cached:
+        return cached
+
+    hosted_rides = Ride.query.filter_by(campus_id=current_user.campus_id, host_id=current_user.id)\
         .order_by(Ride.departure_time.desc()).limit(5).all()
 
+    commutes = RideTemplate.query.filter_by(campus_id=current_user.campus_id,
+                                            host_id=current_user.id, active=True).all()
+
     my_requests = RideRequest.query.filter_by(rider_id=current_user.id)\
         .order_by(RideRequest.created_at.desc()).limit(5).all()
 
@@ -37,6 +64,7 @@ def index():
         'pending_requests': len([r for r in hosted_rides for req in r.requests if req.status == 'pending']),
     }
 
-    return render_template('dashboard/index.html', hosted_rides=hosted_rides,
-                           my_requests=my_requests, upcoming=upcoming, stats=stats,
-                           now=datetime.now())
+    return with_validators(render_template('dashboard/index.html', hosted_rides=hosted_rides,
+                                           my_requests=my_requests, upcoming=upcoming, stats=stats,
+                                           commutes=commutes, now=now),
+                           etag=etag)
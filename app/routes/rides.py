@@ -1,21 +1,50 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, abort
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta, date as date_type
 from app import db
-from app.models import Ride, RideRequest, User, Message
+from app.models import Ride, RideRequest, RideTemplate, User, Message
+from app.utils.conditional import not_modified, with_validators, viewer_tag, http_time
 from config import Config
 
 rides_bp = Blueprint('rides', __name__)
 
+def _get_ride_or_404(ride_id):
+    """Rides are only visible inside their own campus."""
+    return Ride.query.filter_by(id=ride_id, campus_id=current_user.campus_id).first_or_404()
+
 @rides_bp.route('/api/fuel-prices')
 def fuel_prices_api():
-    """Live fuel prices for Chennai — scraped from goodreturns.in, cached 6h."""
-    from app.utils.fuel_prices import get_fuel_prices
-    return jsonify(get_fuel_prices())
+    """Live fuel prices for the user's campus city (or ?campus=<slug>) — scraped from goodreturns.in, cached 6h.
+    Answers If-Modified-Since with 304 until the next fetch."""
+    from app.utils.fuel_prices import get_fuel_prices, fetched_at
+    from app.utils.campus import current_campus, get_campus_by_slug
+    campus = get_campus_by_slug(request.args.get('campus', '')) or current_campus()
+    prices = get_fuel_prices(campus.fuel_city)
+    last_fetch = fetched_at(campus.fuel_city)
+    last_modified = http_time(last_fetch) if last_fetch else None
+    return not_modified(last_modified=last_modified) or \
+        with_validators(jsonify(prices), last_modified=last_modified)
+
+@rides_bp.route('/api/demand-heatmap')
+@login_required
+def demand_heatmap_api():
+    """Precomputed search/request/ride counts per grid cell for one hour of the week.
+    ?at=YYYY-MM-DDTHH:MM picks the hour (defaults to now)."""
+    from app.utils.demand import get_heatmap, hour_of_week
+    at = datetime.now()
+    at_str = request.args.get('at', '')
+    if at_str:
+        try:
+            at = datetime.strptime(at_str, '%Y-%m-%dT%H:%M')
+        except ValueError:
+            return jsonify({'error': 'Invalid time format.'}), 400
+    return jsonify(get_heatmap(current_user.campus_id, hour_of_week(at)))
 
 @rides_bp.route('/host', methods=['GET', 'POST'])
 @login_required
 def host_ride():
+    from app.utils.fuel_prices import get_fuel_prices
+    campus = current_user.campus
     if not current_user.has_car:
         flash('You need to register a car to host rides. Update your profile first.', 'warning')
         return redirect(url_for('auth.profile'))
@@ -26,11 +55,12 @@ def host_ride():
         start_lng = request.form.get('start_lng', type=float)
         dest_lat = request.form.get('dest_lat', type=float)
         dest_lng = request.form.get('dest_lng', type=float)
-        destination = request.form.get('destination', 'SRM IST Campus').strip()
+        destination = request.form.get('destination', campus.name).strip()
         departure_str = request.form.get('departure_time', '')
         available_seats = request.form.get('available_seats', type=int)
         fuel_cost = request.form.get('fuel_cost', type=float, default=0.0)
         notes = request.form.get('notes', '').strip()
+        repeat_days = sorted({d for d in request.form.getlist('repeat_days', type=int) if 0 <= d <= 6})
 
         errors = []
         if not start_location:
@@ -52,19 +82,21 @@ def host_ride():
         if errors:
             return render_template('rides/host.html', errors=errors, form_data=request.form,
                                    maps_key=Config.GOOGLE_MAPS_API_KEY,
-                                   college_lat=Config.COLLEGE_LOCATION['lat'],
-                                   college_lng=Config.COLLEGE_LOCATION['lng'],
-                                   college_name=Config.COLLEGE_NAME)
-
-        ride = Ride(
+                                   college_lat=campus.lat,
+                                   college_lng=campus.lng,
+                                   college_name=campus.name,
+                                   campus_name=campus.short_name,
+                                   fuel_prices=get_fuel_prices(campus.fuel_city))
+
+        route = dict(
+            campus_id=current_user.campus_id,
             host_id=current_user.id,
             start_location=start_location,
             start_lat=start_lat,
             start_lng=start_lng,
             destination=destination,
-            dest_lat=dest_lat or Config.COLLEGE_LOCATION['lat'],
-            dest_lng=dest_lng or Config.COLLEGE_LOCATION['lng'],
-            departure_time=departure_time,
+            dest_lat=dest_lat or campus.lat,
+            dest_lng=dest_lng or campus.lng,
             available_seats=available_seats,
             total_fuel_cost=fuel_cost,
             distance_km=request.form.get('distance_km', 0.0, type=float),
@@ -72,18 +104,36 @@ def host_ride():
             fuel_type=request.form.get('fuel_type', current_user.fuel_type or 'petrol'),
             passenger_preference=request.form.get('passenger_preference', 'any'),
             notes=notes,
-            status='confirmed'
         )
+
+        # Repeating commute: save the route once, then generate the coming days from it
+        template = None
+        if repeat_days:
+            template = RideTemplate(weekday_mask=sum(1 << d for d in repeat_days),
+                                    departure=departure_time.time(), **route)
+            db.session.add(template)
+            db.session.flush()
+
+        ride = Ride(departure_time=departure_time, status='confirmed',
+                    template_id=template.id if template else None, **route)
         db.session.add(ride)
         db.session.commit()
-        flash('Ride posted! It is now live — students can request to join.', 'success')
+
+        if template:
+            from app.utils.commutes import try_generate
+            created = try_generate([template])
+            flash(f'Commute saved! This ride and {created} more for the coming week are live.', 'success')
+        else:
+            flash('Ride posted! It is now live — students can request to join.', 'success')
         return redirect(url_for('rides.ride_detail', ride_id=ride.id))
 
     return render_template('rides/host.html', errors=[], form_data={},
                            maps_key=Config.GOOGLE_MAPS_API_KEY,
-                           college_lat=Config.COLLEGE_LOCATION['lat'],
-                           college_lng=Config.COLLEGE_LOCATION['lng'],
-                           college_name=Config.COLLEGE_NAME)
+                           college_lat=campus.lat,
+                           college_lng=campus.lng,
+                           college_name=campus.name,
+                           campus_name=campus.short_name,
+                           fuel_prices=get_fuel_prices(campus.fuel_city))
 
 @rides_bp.route('/find', methods=['GET', 'POST'])
 @login_required
@@ -93,6 +143,8 @@ def find_ride():
 
     if request.method == 'POST':
         pickup_location = request.form.get('pickup_location', '').strip()
+        pickup_lat = request.form.get('pickup_lat', type=float)
+        pickup_lng = request.form.get('pickup_lng', type=float)
         search_date = request.form.get('search_date', '')
         preferred_time = request.form.get('preferred_time', '')
         girls_only = request.form.get('girls_only') == '1'
@@ -100,10 +152,14 @@ def find_ride():
             'pickup_location': pickup_location,
             'search_date': search_date,
             'preferred_time': preferred_time,
-            'girls_only': girls_only
+            'girls_only': girls_only,
+            'pickup_lat': pickup_lat,
+            'pickup_lng': pickup_lng
         }
+        wanted_at = datetime.now()
 
         query = Ride.query.filter(
+            Ride.campus_id == current_user.campus_id,
             Ride.status.in_(['pending', 'confirmed']),
             Ride.host_id != current_user.id
         )
@@ -119,6 +175,7 @@ def find_ride():
         if search_date:
             try:
                 search_dt = datetime.strptime(search_date, '%Y-%m-%d')
+                wanted_at = search_dt.replace(hour=wanted_at.hour, minute=wanted_at.minute)
                 day_start = search_dt.replace(hour=0, minute=0, second=0)
                 day_end = search_dt.replace(hour=23, minute=59, second=59)
                 query = query.filter(Ride.departure_time.between(day_start, day_end))
@@ -128,6 +185,7 @@ def find_ride():
                         pref_time = datetime.strptime(f"{search_date} {preferred_time}", '%Y-%m-%d %H:%M')
                         time_from = pref_time - timedelta(hours=1)
                         time_to = pref_time + timedelta(hours=1)
+                        wanted_at = pref_time
                         query = query.filter(Ride.departure_time.between(time_from, time_to))
                     except ValueError:
                         pass
@@ -143,6 +201,11 @@ def find_ride():
         user_request_ride_ids = {r.ride_id for r in current_user.ride_requests}
         rides = [r for r in rides if r.id not in user_request_ride_ids]
 
+        from app.utils.demand import log_search
+        log_search(campus_id=current_user.campus_id, user_id=current_user.id, pickup_location=pickup_location,
+                   pickup_lat=pickup_lat, pickup_lng=pickup_lng,
+                   wanted_at=wanted_at, results=len(rides))
+
     import json
     rides_json = json.dumps([{
         'id': r.id,
@@ -153,18 +216,30 @@ def find_ride():
 
     from datetime import date as _date
     _today = _date.today()
+    campus = current_user.campus
     return render_template('rides/find.html', rides=rides, search_data=search_data,
                            rides_json=rides_json,
                            maps_key=Config.GOOGLE_MAPS_API_KEY,
-                           college_lat=Config.COLLEGE_LOCATION['lat'],
-                           college_lng=Config.COLLEGE_LOCATION['lng'],
+                           college_lat=campus.lat,
+                           college_lng=campus.lng,
+                           campus_name=campus.short_name,
                            today=_today.strftime('%Y-%m-%d'),
                            tomorrow=(_today + timedelta(days=1)).strftime('%Y-%m-%d'))
 
 @rides_bp.route('/ride/<int:ride_id>')
 @login_required
 def ride_detail(ride_id):
-    ride = Ride.query.get_or_404(ride_id)
+    # Validate against the version column alone before loading the ride and its chat
+    version = db.session.query(Ride.version)\
+        .filter_by(id=ride_id, campus_id=current_user.campus_id).scalar()
+    if version is None:
+        abort(404)
+    etag = f'ride-{ride_id}-v{version}-{viewer_tag()}'
+    cached = not_modified(etag=etag)
+    if cached:
+        return cached
+
+    ride = _get_ride_or_404(ride_id)
     user_request = RideRequest.query.filter_by(ride_id=ride_id, rider_id=current_user.id).first()
 
     # Get waypoints for confirmed passengers
@@ -180,16 +255,17 @@ def ride_detail(ride_id):
     import json
     waypoints_json = json.dumps(waypoints)
 
-    return render_template('rides/detail.html', ride=ride, user_request=user_request,
-                           waypoints_json=waypoints_json,
-                           maps_key=Config.GOOGLE_MAPS_API_KEY,
-                           college_lat=Config.COLLEGE_LOCATION['lat'],
-                           college_lng=Config.COLLEGE_LOCATION['lng'])
+    return with_validators(render_template('rides/detail.html', ride=ride, user_request=user_request,
+                                           waypoints_json=waypoints_json,
+                                           maps_key=Config.GOOGLE_MAPS_API_KEY,
+                                           college_lat=ride.campus.lat,
+                                           college_lng=ride.campus.lng),
+                           etag=etag)
 
 @rides_bp.route('/ride/<int:ride_id>/chat', methods=['POST'])
 @login_required
 def send_message(ride_id):
-    ride = Ride.query.get_or_404(ride_id)
+    ride = _get_ride_or_404(ride_id)
     content = request.form.get('content', '').strip()
 
     # Safety check: sender must be host or a confirmed passenger
@@ -207,7 +283,7 @@ def send_message(ride_id):
 @rides_bp.route('/ride/<int:ride_id>/request', methods=['POST'])
 @login_required
 def request_ride(ride_id):
-    ride = Ride.query.get_or_404(ride_id)
+    ride = _get_ride_or_404(ride_id)
     if ride.host_id == current_user.id:
         flash('You cannot request your own ride.', 'danger')
         return redirect(url_for('rides.ride_detail', ride_id=ride_id))
@@ -241,12 +317,12 @@ def request_ride(ride_id):
 @rides_bp.route('/ride/<int:ride_id>/manage/<int:request_id>/<action>')
 @login_required
 def manage_request(ride_id, request_id, action):
-    ride = Ride.query.get_or_404(ride_id)
+    ride = _get_ride_or_404(ride_id)
     if ride.host_id != current_user.id:
         flash('Only the host can manage requests.', 'danger')
         return redirect(url_for('rides.ride_detail', ride_id=ride_id))
 
-    ride_req = RideRequest.query.get_or_404(request_id)
+    ride_req = RideRequest.query.filter_by(id=request_id, ride_id=ride.id).first_or_404()
     if action == 'confirm':
         if ride.seats_available <= 0:
             flash('No more seats available.', 'danger')
@@ -263,7 +339,7 @@ def manage_request(ride_id, request_id, action):
 @rides_bp.route('/ride/<int:ride_id>/status/<status>')
 @login_required
 def update_ride_status(ride_id, status):
-    ride = Ride.query.get_or_404(ride_id)
+    ride = _get_ride_or_404(ride_id)
     if ride.host_id != current_user.id:
         flash('Only the host can update ride status.', 'danger')
         return redirect(url_for('rides.ride_detail', ride_id=ride_id))
@@ -284,3 +360,13 @@ def cancel_request(ride_id):
         db.session.commit()
         flash('Ride request cancelled.', 'info')
     return redirect(url_for('rides.ride_detail', ride_id=ride_id))
+
+@rides_bp.route('/commute/<int:template_id>/stop')
+@login_required
+def stop_commute(template_id):
+    template = RideTemplate.query.filter_by(id=template_id, campus_id=current_user.campus_id,
+                                            host_id=current_user.id).first_or_404()
+    template.active = False
+    db.session.commit()
+    flash('Commute stopped. Rides already posted stay live.', 'info')
+    return redirect(url_for('dashboard.index'))
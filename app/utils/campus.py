@@ -0,0 +1,123 @@
+"""
+Campus partitioning.
+Every user and ride belongs to one campus. Campus rows are few and rarely
+change, so they are cached in memory (detached from any session) and looked
+up by id, slug or email pattern without a query.
+
+A large campus can be moved to its own database: add its URL to
+SQLALCHEMY_BINDS (env DATABASE_URL_<KEY>) and set Campus.bind_key. Once
+use_campus() has been called for a request or background job, CampusSession
+routes every campus-scoped table to that bind; the global tables below
+always stay on the default database.
+"""
+import re
+import logging
+import threading
+
+from flask import g, has_app_context, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import inspect
+
+logger = logging.getLogger(__name__)
+
+# Shared by all campuses — never routed to a campus bind
+GLOBAL_TABLES = {'campuses', 'fuel_price_history'}
+
+_campuses = {}        # id -> detached Campus
+_patterns = {}        # id -> compiled email regex
+_lock = threading.Lock()
+
+
+class CampusSession(Session):
+    """db.session that sends campus-scoped tables to the active campus's bind."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        key = g.get('campus_bind') if bind is None and has_app_context() else None
+        if key:
+            if mapper is not None:
+                table = inspect(mapper).local_table
+            else:
+                table = getattr(clause, 'table', clause)
+            if getattr(table, 'name', None) not in GLOBAL_TABLES:
+                return self._db.engines[key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def use_campus(campus):
+    """Route campus-scoped queries in this app context to `campus`'s database."""
+    g.campus_bind = campus.bind_key if campus is not None else None
+
+
+def campus_tables(metadata):
+    """Tables that live in a campus bind (everything but GLOBAL_TABLES)."""
+    return [t for t in metadata.sorted_tables if t.name not in GLOBAL_TABLES]
+
+
+def seed_campuses(seeds):
+    """
+    Sync the campuses table with Config.CAMPUSES: insert new slugs and copy
+    config changes (pattern, location, fuel city, bind_key) onto existing rows.
+    Campuses dropped from the config are kept — their users and rides remain.
+    """
+    from app import db
+    from app.models import Campus
+    existing = {c.slug: c for c in Campus.query.all()}
+    for seed in seeds:
+        campus = existing.get(seed['slug'])
+        if campus is None:
+            db.session.add(Campus(**seed))
+            continue
+        seed = {'bind_key': None, **seed}   # no bind_key == the default database
+        if campus.bind_key != seed['bind_key']:
+            logger.warning(f"Campus {campus.slug} now uses bind {seed['bind_key'] or 'default'}; "
+                           f'its existing users and rides must be copied there')
+        for field, value in seed.items():
+            setattr(campus, field, value)
+    db.session.commit()
+    _load()
+
+
+def _load():
+    """(Re)fill the in-memory campus cache. Needs an app context."""
+    global _campuses, _patterns
+    from app import db
+    from app.models import Campus
+    rows = Campus.query.order_by(Campus.id).all()
+    for c in rows:
+        db.session.expunge(c)
+    with _lock:
+        _campuses = {c.id: c for c in rows}
+        _patterns = {c.id: re.compile(c.email_pattern, re.IGNORECASE) for c in rows}
+
+
+def all_campuses():
+    if not _campuses:
+        _load()
+    return list(_campuses.values())
+
+
+def get_campus(campus_id):
+    """Campus by id; ids from pre-campus login sessions fall back to the first campus."""
+    if not _campuses:
+        _load()
+    return _campuses.get(campus_id) or next(iter(_campuses.values()), None)
+
+
+def current_campus():
+    """The logged-in user's campus; the first campus for anonymous requests and jobs."""
+    from flask_login import current_user
+    if has_request_context() and current_user.is_authenticated:
+        return current_user.campus
+    return get_campus(None)
+
+
+def get_campus_by_slug(slug):
+    return next((c for c in all_campuses() if c.slug == slug), None)
+
+
+def campus_for_email(email):
+    """The campus whose email pattern matches, or None if no campus accepts it."""
+    for c in all_campuses():
+        if _patterns[c.id].match(email):
+            return c
+    return None
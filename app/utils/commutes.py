@@ -0,0 +1,125 @@
+"""
+Recurring commute generator.
+Materializes active RideTemplates into Ride rows for the next
+COMMUTE_DAYS_AHEAD days: one bulk insert per campus, skipping departures
+that already exist, so running it again is a no-op. Route distance and
+cost come from the template — no Directions lookups.
+Runs in the background at most every few hours, triggered from the dashboard.
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import insert
+
+from app import db
+from app.models import Ride, RideTemplate
+from app.utils.campus import all_campuses, use_campus
+
+logger = logging.getLogger(__name__)
+
+_last_run_time = None
+_RUN_TTL = timedelta(hours=6)
+_lock = threading.Lock()
+
+
+def generate_rides(templates, days=None, now=None):
+    """
+    Insert the missing rides for `templates` (all in the active campus) over
+    the next `days` days. Returns the number of rides created.
+    """
+    if days is None:
+        days = current_app.config['COMMUTE_DAYS_AHEAD']
+    now = now or datetime.now()
+    templates = [t for t in templates if t.active]
+    if not templates:
+        return 0
+
+    window_end = datetime.combine(now.date() + timedelta(days=days), datetime.min.time())
+    existing = {tuple(row) for row in db.session.query(Ride.template_id, Ride.departure_time).filter(
+        Ride.template_id.in_([t.id for t in templates]),
+        Ride.departure_time > now,
+        Ride.departure_time < window_end,
+    )}
+
+    rows = []
+    for t in templates:
+        for offset in range(days):
+            day = now.date() + timedelta(days=offset)
+            departure = datetime.combine(day, t.departure)
+            if not t.runs_on(day) or departure <= now or (t.id, departure) in existing:
+                continue
+            rows.append({
+                'campus_id': t.campus_id,
+                'host_id': t.host_id,
+                'template_id': t.id,
+                'start_location': t.start_location,
+                'start_lat': t.start_lat,
+                'start_lng': t.start_lng,
+                'destination': t.destination,
+                'dest_lat': t.dest_lat,
+                'dest_lng': t.dest_lng,
+                'departure_time': departure,
+                'available_seats': t.available_seats,
+                'total_fuel_cost': t.total_fuel_cost,
+                'distance_km': t.distance_km,
+                'vehicle_type': t.vehicle_type,
+                'fuel_type': t.fuel_type,
+                'passenger_preference': t.passenger_preference,
+                'notes': t.notes,
+                'status': 'confirmed',
+            })
+
+    if rows:
+        db.session.execute(insert(Ride), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def try_generate(templates):
+    """generate_rides() that logs instead of raising — e.g. when a concurrent
+    run inserted the same rides first and the unique index rejects ours."""
+    ids = [t.id for t in templates]
+    try:
+        return generate_rides(templates)
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f'Commute generation failed for templates {ids}: {e}')
+        return 0
+
+
+def generate_all():
+    """Run the generator for every campus, one transaction each."""
+    created = 0
+    for campus in all_campuses():
+        use_campus(campus)
+        try:
+            templates = RideTemplate.query.filter_by(campus_id=campus.id, active=True).all()
+            created += generate_rides(templates)
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f'Commute generation failed for {campus.slug}: {e}')
+    logger.info(f'Commute rides generated: {created}')
+    return created
+
+
+def _do_generate(app):
+    """Background run — uses its own app context."""
+    global _last_run_time
+    with app.app_context():
+        generate_all()
+    with _lock:
+        _last_run_time = datetime.now()
+
+
+def ensure_generated():
+    """Kick off a background run if the last one is older than _RUN_TTL."""
+    global _last_run_time
+    with _lock:
+        if _last_run_time is not None and datetime.now() - _last_run_time <= _RUN_TTL:
+            return
+        _last_run_time = datetime.now()   # claim this run so concurrent requests don't start another
+    threading.Thread(target=_do_generate,
+                     args=(current_app._get_current_object(),),
+                     daemon=True).start()
@@ -0,0 +1,59 @@
+"""
+Conditional GET helpers.
+Routes compute a cheap validator (a version or fetch time) first and call
+not_modified() before loading anything else; if the client's copy is still
+current they return its 304 straight away. Otherwise they render as usual
+and pass the response through with_validators(). A response that shows a
+flash message is sent without validators, so the banner is never replayed
+from cache.
+"""
+import zlib
+from datetime import datetime, timezone
+
+from flask import Response, g, make_response, request, session
+from flask_login import current_user
+
+
+def http_time(dt: datetime) -> datetime:
+    """Naive local datetime -> aware UTC at whole-second HTTP precision."""
+    return dt.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def viewer_tag() -> str:
+    """Part of an ETag for pages that render the logged-in user (nav, greeting, buttons)."""
+    profile = f'{current_user.name}|{current_user.gender}|{current_user.has_vehicle}|{current_user.campus_id}'
+    return f'u{current_user.id}-{zlib.crc32(profile.encode()):08x}'
+
+
+def _set_validators(response, etag=None, last_modified=None):
+    if etag:
+        response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    # Per-user pages: browsers may keep them but must revalidate every time
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def not_modified(etag=None, last_modified=None):
+    """A 304 response if the request's If-None-Match / If-Modified-Since still match, else None."""
+    if session.get('_flashes'):
+        g.flash_shown = True   # rendered once: with_validators() must not tag it
+        return None
+    if etag and request.if_none_match:
+        fresh = request.if_none_match.contains_weak(etag)
+    elif last_modified and request.if_modified_since:
+        fresh = request.if_modified_since >= last_modified
+    else:
+        fresh = False
+    if not fresh:
+        return None
+    return _set_validators(Response(status=304), etag, last_modified)
+
+
+def with_validators(rv, etag=None, last_modified=None):
+    """Wrap a view's return value and attach ETag / Last-Modified headers."""
+    if g.get('flash_shown') or session.get('_flashes'):
+        etag = last_modified = None
+    return _set_validators(make_response(rv), etag, last_modified)
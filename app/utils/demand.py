@@ -0,0 +1,189 @@
+"""
+Ride demand heatmap.
+Search events are queued in memory and written in batches by a background
+thread, so logging never touches the DB on the request thread. A periodic
+rebuild bins search pickups, request pickups and ride start points into a
+campus x lat/lng grid x hour-of-week cube stored in the demand_cells table.
+"""
+import queue
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import Integer, case, cast, delete, extract, func, insert, select
+
+from app import db
+from app.models import DemandCell, Ride, RideRequest, SearchEvent
+from app.utils.campus import get_campus, use_campus
+
+logger = logging.getLogger(__name__)
+
+_BATCH_SIZE = 200
+_FLUSH_INTERVAL = 5            # seconds a partial batch may wait
+_queue = queue.Queue(maxsize=10000)
+_writer = None
+
+_built_at = {}                 # campus_id -> time of its last successful rebuild
+_BUILD_TTL = timedelta(hours=1)
+_lock = threading.Lock()
+_build_locks = {}              # campus_id -> Lock held while that campus rebuilds
+
+
+def hour_of_week(dt: datetime) -> int:
+    """Sunday 00:00 == 0, matching SQL extract('dow')."""
+    return (dt.isoweekday() % 7) * 24 + dt.hour
+
+
+# ── Search logging ────────────────────────────────────────────────────────────
+
+def log_search(**event):
+    """Queue a SearchEvent row. Never blocks; drops the event if the queue is full."""
+    global _writer
+    event.setdefault('created_at', datetime.utcnow())
+    try:
+        _queue.put_nowait(event)
+    except queue.Full:
+        logger.warning('Search log queue full — dropping event')
+        return
+
+    if _writer is None or not _writer.is_alive():
+        with _lock:
+            if _writer is None or not _writer.is_alive():
+                _writer = threading.Thread(target=_write_loop,
+                                           args=(current_app._get_current_object(),),
+                                           daemon=True)
+                _writer.start()
+
+
+def _write_loop(app):
+    """Drain the queue forever, inserting up to _BATCH_SIZE rows per statement."""
+    while True:
+        batch = [_queue.get()]
+        deadline = time.monotonic() + _FLUSH_INTERVAL
+        while len(batch) < _BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        by_campus = {}
+        for event in batch:
+            by_campus.setdefault(event.get('campus_id'), []).append(event)
+        for campus_id, events in by_campus.items():
+            try:
+                with app.app_context():
+                    use_campus(get_campus(campus_id))
+                    db.session.execute(insert(SearchEvent), events)
+                    db.session.commit()
+            except Exception as e:
+                logger.warning(f'Search log flush failed ({len(events)} events): {e}')
+
+
+# ── Aggregation ───────────────────────────────────────────────────────────────
+
+def _binned(lat_col, lng_col, ts_col):
+    """Grid/hour-of-week bucket expressions, evaluated in SQL."""
+    g = current_app.config['DEMAND_GRID_DEG']
+    return (
+        cast(extract('dow', ts_col), Integer) * 24 + cast(extract('hour', ts_col), Integer),
+        cast(func.round(lat_col / g), Integer),
+        cast(func.round(lng_col / g), Integer),
+    )
+
+
+def _aggregate(lat_col, lng_col, ts_col, where, *aggs):
+    """GROUP BY (hour_of_week, lat_idx, lng_idx) — the binning runs in the database."""
+    keys = _binned(lat_col, lng_col, ts_col)
+    where = [lat_col.isnot(None), lng_col.isnot(None), *where]
+    return db.session.execute(select(*keys, *aggs).where(*where).group_by(*keys)).all()
+
+
+def rebuild_demand_cells(campus):
+    """Recompute one campus's demand_cells from the last DEMAND_WINDOW_DAYS of data."""
+    use_campus(campus)
+    since = datetime.now() - timedelta(days=current_app.config['DEMAND_WINDOW_DAYS'])
+    cells = {}   # (how, lat_idx, lng_idx) -> [searches, unmet, requests, rides]
+
+    def merge(rows, slot):
+        for how, lat_idx, lng_idx, *counts in rows:
+            cell = cells.setdefault((how, lat_idx, lng_idx), [0, 0, 0, 0])
+            for i, n in enumerate(counts):
+                cell[slot + i] += int(n or 0)
+
+    merge(_aggregate(SearchEvent.pickup_lat, SearchEvent.pickup_lng, SearchEvent.wanted_at,
+                     [SearchEvent.campus_id == campus.id, SearchEvent.wanted_at >= since],
+                     func.count(), func.sum(case((SearchEvent.results == 0, 1), else_=0))), 0)
+    merge(_aggregate(RideRequest.pickup_lat, RideRequest.pickup_lng, Ride.departure_time,
+                     [RideRequest.ride_id == Ride.id, Ride.campus_id == campus.id,
+                      Ride.departure_time >= since],
+                     func.count()), 2)
+    merge(_aggregate(Ride.start_lat, Ride.start_lng, Ride.departure_time,
+                     [Ride.campus_id == campus.id, Ride.status != 'cancelled',
+                      Ride.departure_time >= since],
+                     func.count()), 3)
+
+    db.session.execute(delete(DemandCell).where(DemandCell.campus_id == campus.id))
+    if cells:
+        db.session.execute(insert(DemandCell), [
+            {'campus_id': campus.id, 'hour_of_week': how, 'lat_idx': lat_idx, 'lng_idx': lng_idx,
+             'searches': c[0], 'unmet': c[1], 'requests': c[2], 'rides': c[3]}
+            for (how, lat_idx, lng_idx), c in cells.items()
+        ])
+    db.session.commit()
+    logger.info(f'Demand cube rebuilt for {campus.slug}: {len(cells)} cells')
+    return len(cells)
+
+
+def _do_rebuild(app, campus_id):
+    """Background rebuild of one campus — runs in its own app context."""
+    with _lock:
+        build_lock = _build_locks.setdefault(campus_id, threading.Lock())
+    if not build_lock.acquire(blocking=False):
+        return   # this campus is already rebuilding
+    try:
+        with app.app_context():
+            campus = get_campus(campus_id)
+            try:
+                rebuild_demand_cells(campus)
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f'Demand cube rebuild failed for {campus.slug}: {e}')
+                return   # stays stale, so the next request retries
+        with _lock:
+            _built_at[campus_id] = datetime.now()
+    finally:
+        build_lock.release()
+
+
+def get_heatmap(campus_id: int, how: int) -> dict:
+    """Return a campus's precomputed cells for one hour-of-week, rebuilding hourly."""
+    built_at = _built_at.get(campus_id)
+    if built_at is None or datetime.now() - built_at > _BUILD_TTL:
+        t = threading.Thread(target=_do_rebuild,
+                             args=(current_app._get_current_object(), campus_id),
+                             daemon=True)
+        t.start()
+        if built_at is None:
+            t.join(timeout=6)   # Wait on this campus's very first load only
+            built_at = _built_at.get(campus_id)
+
+    g = current_app.config['DEMAND_GRID_DEG']
+    rows = DemandCell.query.filter_by(campus_id=campus_id, hour_of_week=how).all()
+    return {
+        'hour_of_week': how,
+        'grid_deg': g,
+        'cells': [{
+            'lat': round(c.lat_idx * g, 6),
+            'lng': round(c.lng_idx * g, 6),
+            'searches': c.searches,
+            'unmet': c.unmet,
+            'requests': c.requests,
+            'rides': c.rides,
+        } for c in rows],
+        'built_at': built_at.strftime('%d %b %Y %I:%M %p') if built_at else None,
+    }
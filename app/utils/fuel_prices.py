@@ -1,29 +1,35 @@
 """
-Real-time fuel price fetcher for Chennai, Tamil Nadu.
-Scrapes live data from goodreturns.in and caches for 6 hours.
-Falls back to hardcoded defaults if scraping fails.
+Real-time fuel price fetcher, one price series per campus city.
+Scrapes live data from goodreturns.in every 6 hours per city and appends
+changed prices to the fuel_price_history table. The history is mirrored in
+memory as sorted per-(city, fuel) arrays, so both the latest price and the price at any
+past moment (price_at) are answered without a query.
+Falls back to hardcoded defaults if nothing has been fetched yet.
 """
 import re
 import logging
 import threading
+from array import array
+from bisect import bisect_right
 from datetime import datetime, timedelta
 
+from flask import current_app, has_app_context
+
 logger = logging.getLogger(__name__)
 
-# Default fallback prices (Chennai, Mar 2026)
+# Default fallback prices (Chennai, Mar 2026), used for any city not yet fetched
 DEFAULTS = {
     'petrol':  102.63,
     'diesel':   88.74,
     'cng':      72.00,
 }
 
-_cache = dict(DEFAULTS)
-_meta = {
-    'last_updated': 'Not yet fetched',
-    'source': 'fallback',
-    'city': 'Chennai'
-}
-_last_fetch_time = None
+# (city, fuel) -> (sorted fetched_at list, matching prices). Replaced wholesale
+# on reload, never mutated, so readers can use a snapshot without the lock.
+_history = {}
+_history_loaded = False
+_meta = {}              # city -> last fetch status
+_last_fetch_time = {}   # city -> datetime
 _CACHE_TTL = timedelta(hours=6)
 _lock = threading.Lock()
 
@@ -69,13 +75,49 @@ def _scrape_price(url: str, label: str) -> float | None:
     return None
 
 
-def _do_fetch():
-    """Background fetch — updates global cache in-place."""
-    global _last_fetch_time, _meta
+def _load_history():
+    """Rebuild the in-memory arrays from fuel_price_history. Needs an app context."""
+    global _history, _history_loaded
+    from app import db
+    from app.models import FuelPrice
+    rows = db.session.query(FuelPrice.city, FuelPrice.fuel, FuelPrice.fetched_at, FuelPrice.price)\
+        .order_by(FuelPrice.city, FuelPrice.fuel, FuelPrice.fetched_at, FuelPrice.id).all()
+    history = {}
+    for city, fuel, fetched_at, price in rows:
+        times, prices = history.setdefault((city, fuel), ([], array('d')))
+        times.append(fetched_at)
+        prices.append(price)
+    with _lock:
+        _history = history
+        _history_loaded = True
+
+
+def _ensure_loaded():
+    """Load the history on first use from any entry point that has an app context."""
+    if not _history_loaded and has_app_context():
+        _load_history()
+
+
+def _record(city: str, updated: dict, source: str):
+    """Append prices that differ from the latest stored ones, then reload."""
+    from app import db
+    from app.models import FuelPrice
+    now = datetime.utcnow()
+    for fuel, price in updated.items():
+        # Compare with the table, not this process's copy — other workers fetch too
+        latest = db.session.query(FuelPrice.price).filter_by(city=city, fuel=fuel)\
+            .order_by(FuelPrice.fetched_at.desc(), FuelPrice.id.desc()).limit(1).scalar()
+        if latest != price:
+            db.session.add(FuelPrice(city=city, fuel=fuel, price=price, source=source, fetched_at=now))
+    db.session.commit()
+    _load_history()
+
+
+def _do_fetch(app, city: str):
+    """Background fetch for one city — appends changed prices to the history table."""
     sources = {
-        'petrol': 'https://www.goodreturns.in/petrol-price-in-chennai.html',
-        'diesel': 'https://www.goodreturns.in/diesel-price-in-chennai.html',
-        'cng':    'https://www.goodreturns.in/cng-price-in-chennai.html',
+        fuel: f'https://www.goodreturns.in/{fuel}-price-in-{city}.html'
+        for fuel in ('petrol', 'diesel', 'cng')
     }
     updated = {}
     for fuel, url in sources.items():
@@ -83,37 +125,82 @@ def _do_fetch():
         if price:
             updated[fuel] = price
 
+    if updated:
+        try:
+            with app.app_context():
+                _record(city, updated, 'goodreturns.in')
+        except Exception as e:
+            logger.warning(f'Fuel price history write failed: {e}')
+
+    meta = {
+        'last_updated': datetime.now().strftime('%d %b %Y %I:%M %p'),
+        'source': 'goodreturns.in (live)' if updated else 'fallback (scrape failed)',
+        'city': city.title(),
+    }
     with _lock:
-        if updated:
-            _cache.update(updated)
-            _meta['source'] = 'goodreturns.in (live)'
-        else:
-            _meta['source'] = 'fallback (scrape failed)'
-        _meta['last_updated'] = datetime.now().strftime('%d %b %Y %I:%M %p')
-        _last_fetch_time = datetime.now()
+        _meta[city] = meta
+        _last_fetch_time[city] = datetime.now()
+
+    logger.info(f"Fuel prices refreshed for {city}: {latest_prices(city)}  source={meta['source']}")
+
+
+def latest_prices(city: str, fallback=True) -> dict:
+    """Most recent known price per fuel in `city`; DEFAULTS fill gaps unless fallback=False."""
+    _ensure_loaded()
+    history = _history
+    latest = {fuel: prices[-1] for (c, fuel), (_, prices) in history.items() if c == city and prices}
+    return {**DEFAULTS, **latest} if fallback else latest
+
+
+def price_at(fuel: str, when: datetime, city: str) -> float | None:
+    """
+    Price of `fuel` in effect at `when` (UTC, like the model timestamps).
+    O(log n) bisect over the in-memory history — safe to call once per ride
+    when re-pricing or exporting thousands of rides.
+    Times before the first record get the earliest known price.
+    """
+    _ensure_loaded()
+    entry = _history.get((city, fuel))
+    if not entry:
+        return DEFAULTS.get(fuel)
+    times, prices = entry
+    i = bisect_right(times, when) - 1
+    return prices[max(i, 0)]
+
+
+def fetched_at(city: str) -> datetime | None:
+    """Local time of the last fetch for `city` — the Last-Modified of its prices."""
+    return _last_fetch_time.get(city)
 
-    logger.info(f"Fuel prices refreshed: {_cache}  source={_meta['source']}")
 
+def get_fuel_prices(city: str) -> dict:
+    """Return current fuel prices dict for a city, auto-refreshing every 6 hours."""
+    _ensure_loaded()
 
-def get_fuel_prices() -> dict:
-    """Return current fuel prices dict, auto-refreshing every 6 hours."""
-    global _last_fetch_time
+    last_fetch = _last_fetch_time.get(city)
     should_fetch = (
-        _last_fetch_time is None or
-        datetime.now() - _last_fetch_time > _CACHE_TTL
+        last_fetch is None or
+        datetime.now() - last_fetch > _CACHE_TTL
     )
     if should_fetch:
         # Fetch in background so page doesn't block
-        t = threading.Thread(target=_do_fetch, daemon=True)
+        t = threading.Thread(target=_do_fetch,
+                             args=(current_app._get_current_object(), city),
+                             daemon=True)
         t.start()
-        if _last_fetch_time is None:
+        if last_fetch is None:
             t.join(timeout=6)   # Wait on very first load only
 
+    latest = latest_prices(city)
     with _lock:
         return {
-            'petrol': _cache.get('petrol', DEFAULTS['petrol']),
-            'diesel': _cache.get('diesel', DEFAULTS['diesel']),
-            'cng':    _cache.get('cng',    DEFAULTS['cng']),
-            'electric_per_km': 1.50,
-            'meta': dict(_meta)
+            'petrol': latest['petrol'],
+            'diesel': latest['diesel'],
+            'cng':    latest['cng'],
+            'electric_per_km': current_app.config['ELECTRIC_COST_PER_KM'],
+            'meta': dict(_meta.get(city) or {
+                'last_updated': 'Not yet fetched',
+                'source': 'fallback',
+                'city': city.title(),
+            })
         }
@@ -0,0 +1,49 @@
+"""
+In-place schema upgrade for databases created by an older BroLift.
+db.create_all() only creates missing tables; it never adds columns or
+indexes to tables that already exist. upgrade_schema() runs after it on
+every start: it adds the missing columns listed below, backfills them, and
+creates any model index the table lacks. Every step checks first, so it is
+safe to run repeatedly.
+"""
+import logging
+
+from sqlalchemy import inspect, text
+
+logger = logging.getLogger(__name__)
+
+# (table, column, column DDL) — added in this order when missing
+COLUMNS = [
+    ('users', 'campus_id', 'INTEGER'),
+    ('rides', 'campus_id', 'INTEGER'),
+    ('rides', 'version', 'INTEGER NOT NULL DEFAULT 1'),
+    ('rides', 'template_id', 'INTEGER REFERENCES ride_templates (id)'),
+]
+
+# Columns filled with the id of the campus that owns the database
+CAMPUS_COLUMNS = [('users', 'campus_id'), ('rides', 'campus_id')]
+
+
+def upgrade_schema(engine, tables, campus_id=None):
+    """Bring `tables` on `engine` up to the current models."""
+    insp = inspect(engine)
+    existing_tables = set(insp.get_table_names())
+    names = {t.name for t in tables}
+
+    with engine.begin() as conn:
+        for table, column, ddl in COLUMNS:
+            if table not in names or table not in existing_tables:
+                continue
+            if column not in {c['name'] for c in insp.get_columns(table)}:
+                conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+                logger.info(f'Schema upgrade: added {table}.{column}')
+
+        if campus_id is not None:
+            for table, column in CAMPUS_COLUMNS:
+                if table in names and table in existing_tables:
+                    conn.execute(text(f'UPDATE {table} SET {column} = :cid WHERE {column} IS NULL'),
+                                 {'cid': campus_id})
+
+    for table in tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
@@ -1,26 +1,68 @@
 import os
+from collections.abc import Mapping
 from dotenv import load_dotenv
 
 load_dotenv()
 
+
+class _FuelPriceView(Mapping):
+    """
+    Read-only mapping of the latest fuel prices for the current campus's city
+    (the logged-in user's, else the first campus) — the same series
+    get_fuel_prices() serves.
+    """
+    def _prices(self):
+        from flask import has_app_context                 # lazy: app imports config
+        from app.utils.fuel_prices import latest_prices
+        if has_app_context():
+            from app.utils.campus import current_campus
+            city = current_campus().fuel_city
+        else:
+            city = Config.CAMPUSES[0]['fuel_city']        # no app yet: only DEFAULTS exist
+        return {**latest_prices(city), 'electric': 0.00}
+
+    def __getitem__(self, fuel): return self._prices()[fuel]
+    def __iter__(self):          return iter(self._prices())
+    def __len__(self):           return len(self._prices())
+    def __repr__(self):          return f'FuelPrices({self._prices()})'
+
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'brolift-secret-key-2024'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///brolift.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     GOOGLE_MAPS_API_KEY = os.environ.get('GOOGLE_MAPS_API_KEY') or 'YOUR_GOOGLE_MAPS_API_KEY_HERE'
 
-    # SRM IST Kattankulathur
-    COLLEGE_EMAIL_DOMAIN = '@srmist.edu.in'
-    COLLEGE_NAME = 'SRM Institute of Science and Technology'
-    COLLEGE_LOCATION = {'lat': 12.8231, 'lng': 80.0444}
+    # Per-campus databases: DATABASE_URL_<KEY>=... becomes bind key '<key>'
+    SQLALCHEMY_BINDS = {
+        k[len('DATABASE_URL_'):].lower(): v
+        for k, v in os.environ.items() if k.startswith('DATABASE_URL_')
+    }
+
+    # Campuses seeded into the campuses table on startup (first one is the default)
+    CAMPUSES = [
+        {
+            'slug': 'srm-ktr',                                  # SRM IST Kattankulathur
+            'name': 'SRM Institute of Science and Technology',
+            'short_name': 'SRM IST',
+            'email_pattern': r'^[a-zA-Z]{2}\d{4}@srmist\.edu\.in$',
+            'email_example': 'st6546@srmist.edu.in',
+            'lat': 12.8231,
+            'lng': 80.0444,
+            'fuel_city': 'chennai',
+        },
+    ]
     MAX_PASSENGERS = 6  # Up to 7‑seater minus driver
 
-    # Real-time fuel prices in Rs (Chennai, updated Feb 2026)
-    # Source: Indian Oil Corporation / PPAC
-    FUEL_PRICES = {
-        'petrol':   102.63,   # Rs per litre
-        'diesel':    88.74,   # Rs per litre
-        'cng':       72.00,   # Rs per kg (~1 kg ≈ 1 litre equivalent)
-        'electric':   0.00,   # Handled separately (Rs per km)
-    }
+    # Fuel prices in Rs for the current campus's city — a live view of
+    # app.utils.fuel_prices, which keeps the fetched price history.
+    # Electric is handled separately (Rs per km).
+    FUEL_PRICES = _FuelPriceView()
     ELECTRIC_COST_PER_KM = 1.50   # Rs per km for electric vehicles
+
+    # Recurring commutes: how many days ahead rides are generated
+    COMMUTE_DAYS_AHEAD = 7
+
+    # Demand heatmap: grid cell size in degrees (~1.1 km) and look-back window
+    DEMAND_GRID_DEG = 0.01
+    DEMAND_WINDOW_DAYS = 56